@@ -13,6 +13,7 @@ Note:
 import argparse
 from datetime import datetime
 from datetime import timezone
+from functools import lru_cache
 import logging
 import re
 import time
@@ -20,6 +21,12 @@ from typing import List
 
 import grpc
 
+# This is an internal protobuf module, so it may not always be available.
+try:
+    from google.protobuf.internal import api_implementation
+except ImportError:
+    api_implementation = None
+
 import starlink_grpc
 
 BRACKETS_RE = re.compile(r"([^[]*)(\[((\d+),|)(\d*)\]|)$")
@@ -29,6 +36,55 @@ HISTORY_STATS_MODES: List[str] = [
     "ping_drop", "ping_run_length", "ping_latency", "ping_loaded_latency", "usage", "power"
 ]
 UNGROUPED_MODES: List[str] = []
+# Index into the groups returned by starlink_grpc.history_stats and data
+# category for each history stats mode, in the order they get reported
+HISTORY_STATS_GROUPS = (
+    ("ping_drop", 1, "ping_stats"),
+    ("ping_run_length", 2, "ping_stats"),
+    ("ping_latency", 3, "ping_stats"),
+    ("ping_loaded_latency", 4, "ping_stats"),
+    ("usage", 5, "usage"),
+    ("power", 6, "power"),
+)
+VERBOSE_FIELD_MAP = {
+    # status fields (the remainder are either self-explanatory or I don't
+    # know with confidence what they mean)
+    "alerts": "Alerts bit field",
+
+    # ping_drop fields
+    "samples": "Parsed samples",
+    "end_counter": "Sample counter",
+    "total_ping_drop": "Total ping drop",
+    "count_full_ping_drop": "Count of drop == 1",
+    "count_obstructed": "Obstructed",
+    "total_obstructed_ping_drop": "Obstructed ping drop",
+    "count_full_obstructed_ping_drop": "Obstructed drop == 1",
+    "count_unscheduled": "Unscheduled",
+    "total_unscheduled_ping_drop": "Unscheduled ping drop",
+    "count_full_unscheduled_ping_drop": "Unscheduled drop == 1",
+
+    # ping_run_length fields
+    "init_run_fragment": "Initial drop run fragment",
+    "final_run_fragment": "Final drop run fragment",
+    "run_seconds": "Per-second drop runs",
+    "run_minutes": "Per-minute drop runs",
+
+    # ping_latency fields
+    "mean_all_ping_latency": "Mean RTT, drop < 1",
+    "deciles_all_ping_latency": "RTT deciles, drop < 1",
+    "mean_full_ping_latency": "Mean RTT, drop == 0",
+    "deciles_full_ping_latency": "RTT deciles, drop == 0",
+    "stdev_full_ping_latency": "RTT standard deviation, drop == 0",
+
+    # ping_loaded_latency is still experimental, so leave those unexplained
+
+    # usage fields
+    "download_usage": "Bytes downloaded",
+    "upload_usage": "Bytes uploaded",
+}
+
+# Padded label text for verbose output, filled in as names are encountered
+VERBOSE_LABELS = {}
 
 
 def create_arg_parser(output_description, bulk_history=True):
@@ -134,6 +190,9 @@ def run_arg_parser(parser, need_id=False, no_stdout_errors=False, modes=None):
     # special group for any status mode other than location
     opts.pure_status_mode = bool(status_set.intersection(opts.mode))
     opts.history_stats_mode = bool(set(HISTORY_STATS_MODES).intersection(opts.mode))
+    opts.history_stats_groups = [(index, category)
+                                 for mode, index, category in HISTORY_STATS_GROUPS
+                                 if mode in opts.mode]
     opts.bulk_mode = "bulk_history" in opts.mode
 
     if opts.samples is None:
@@ -161,9 +220,19 @@ def conn_error(opts, msg, *args):
         logging.error(msg, *args)
 
 
+def check_protobuf_implementation():
+    """Warn if protobuf is using its (much slower) pure Python implementation."""
+    if api_implementation is not None and api_implementation.Type() == "python":
+        logging.warning("protobuf module is using its pure Python implementation, which is "
+                        "much slower at decoding dish data; upgrading protobuf may fix this")
+
+
 class GlobalState:
     """A class for keeping state across loop iterations."""
     def __init__(self, target=None):
+        # The scripts all create this right after setting up logging, so this
+        # is a convenient place to check.
+        check_protobuf_implementation()
         # counter, timestamp for bulk_history:
         self.counter = None
         self.timestamp = None
@@ -176,6 +245,9 @@ class GlobalState:
         self.accum_history = None
         self.first_poll = True
         self.warn_once_location = True
+        # history data polled for stats, for reuse by bulk data in same loop
+        self.polled_history = None
+        self.polled_history_time = None
 
     def shutdown(self):
         self.context.close()
@@ -237,9 +309,32 @@ def get_data(opts, gstate, add_item, add_sequence, add_bulk=None, flush_history=
     return rc, status_ts, hist_ts
 
 
+@lru_cache(maxsize=None)
+def parse_field_name(key):
+    """Split a field name into base name and sequence start and end.
+
+    The same field names get reported every loop, so the results are cached.
+
+    Returns:
+        A tuple of name, start, and end. The start and end values are strings,
+        with start being None if the name does not specify a sequence start
+        and end being None if the name does not indicate a sequence.
+    """
+    return BRACKETS_RE.match(key).group(1, 4, 5)
+
+
+def verbose_label(name):
+    """Return the padded label text that precedes a value in verbose output."""
+    label = VERBOSE_LABELS.get(name)
+    if label is None:
+        label = "{0:22} ".format(VERBOSE_FIELD_MAP.get(name, name) + ":")
+        VERBOSE_LABELS[name] = label
+    return label
+
+
 def add_data_normal(data, category, add_item, add_sequence):
     for key, val in data.items():
-        name, start, seq = BRACKETS_RE.match(key).group(1, 4, 5)
+        name, start, seq = parse_field_name(key)
         if seq is None:
             add_item(name, val, category)
         else:
@@ -248,7 +343,7 @@ def add_data_normal(data, category, add_item, add_sequence):
 
 def add_data_numeric(data, category, add_item, add_sequence):
     for key, val in data.items():
-        name, start, seq = BRACKETS_RE.match(key).group(1, 4, 5)
+        name, start, seq = parse_field_name(key)
         if seq is None:
             add_item(name, int(val) if isinstance(val, int) else val, category)
         else:
@@ -311,16 +406,22 @@ def get_status_data(opts, gstate, add_item, add_sequence):
 
 def get_history_stats(opts, gstate, add_item, add_sequence, flush_history):
     """Fetch history stats.  See `get_data` for details."""
+    gstate.polled_history = None
     if flush_history or (opts.need_id and gstate.dish_id is None):
         history = None
     else:
         try:
-            timestamp = int(time.time())
+            before = time.time()
             history = starlink_grpc.get_history(context=gstate.context)
-            gstate.timestamp_stats = timestamp
+            gstate.timestamp_stats = int(before)
         except (AttributeError, ValueError, grpc.RpcError) as e:
             conn_error(opts, "Failure getting history: %s", str(starlink_grpc.GrpcError(e)))
             history = None
+        else:
+            # Only hold on to this if bulk mode is going to reuse it
+            if opts.bulk_mode:
+                gstate.polled_history = history
+                gstate.polled_history_time = before
 
     parse_samples = opts.samples if gstate.counter_stats is None else -1
     start = gstate.counter_stats if gstate.counter_stats else None
@@ -370,21 +471,11 @@ def get_history_stats(opts, gstate, add_item, add_sequence, flush_history):
                                          start=start,
                                          verbose=opts.verbose,
                                          history=gstate.accum_history)
-    general, ping, runlen, latency, loaded, usage, power = groups[0:7]
+    general = groups[0]
     add_data = add_data_numeric if opts.numeric else add_data_normal
     add_data(general, "ping_stats", add_item, add_sequence)
-    if "ping_drop" in opts.mode:
-        add_data(ping, "ping_stats", add_item, add_sequence)
-    if "ping_run_length" in opts.mode:
-        add_data(runlen, "ping_stats", add_item, add_sequence)
-    if "ping_latency" in opts.mode:
-        add_data(latency, "ping_stats", add_item, add_sequence)
-    if "ping_loaded_latency" in opts.mode:
-        add_data(loaded, "ping_stats", add_item, add_sequence)
-    if "usage" in opts.mode:
-        add_data(usage, "usage", add_item, add_sequence)
-    if "power" in opts.mode:
-        add_data(power, "power", add_item, add_sequence)
+    for index, category in opts.history_stats_groups:
+        add_data(groups[index], category, add_item, add_sequence)
     if not opts.no_counter:
         gstate.counter_stats = general["end_counter"]
 
@@ -397,7 +488,14 @@ def get_history_stats(opts, gstate, add_item, add_sequence, flush_history):
 
 def get_bulk_data(opts, gstate, add_bulk):
     """Fetch bulk data.  See `get_data` for details."""
-    before = time.time()
+    # If history stats were also requested, the history data was already
+    # polled this loop, so use that instead of making another request.
+    history = gstate.polled_history
+    if history is None:
+        before = time.time()
+    else:
+        before = gstate.polled_history_time
+        gstate.polled_history = None
 
     start = gstate.counter
     parse_samples = opts.bulk_samples if start is None else -1
@@ -405,7 +503,8 @@ def get_bulk_data(opts, gstate, add_bulk):
         general, bulk = starlink_grpc.history_bulk_data(parse_samples,
                                                         start=start,
                                                         verbose=opts.verbose,
-                                                        context=gstate.context)
+                                                        context=gstate.context,
+                                                        history=history)
     except starlink_grpc.GrpcError as e:
         conn_error(opts, "Failure getting history: %s", str(e))
         return 1
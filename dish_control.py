@@ -57,58 +57,66 @@ def parse_args():
     return opts
 
 
-def loop_body(opts):
-    reflector = yagrc_reflector.GrpcReflectionClient()
+def loop_body(opts, channel):
     try:
-        with grpc.insecure_channel(opts.target) as channel:
+        # Reflection only needs to happen once, since the channel is reused.
+        # This script has no GlobalState object, so the results are kept on
+        # opts, but only once both of them have been obtained successfully.
+        if opts.stub is None:
+            reflector = yagrc_reflector.GrpcReflectionClient()
             reflector.load_protocols(channel, symbols=["SpaceX.API.Device.Device"])
             stub = reflector.service_stub_class("SpaceX.API.Device.Device")(channel)
             request_class = reflector.message_class("SpaceX.API.Device.Request")
-            if opts.command == "reboot":
-                request = request_class(reboot={})
-            elif opts.command == "stow":
-                request = request_class(dish_stow={})
-            elif opts.command == "unstow":
-                request = request_class(dish_stow={"unstow": True})
-            elif opts.command == "set_sleep":
-                if opts.start is None and opts.duration is None:
-                    request = request_class(dish_get_config={})
-                else:
-                    if opts.duration:
-                        request = request_class(
-                            dish_power_save={
-                                "power_save_start_minutes": opts.start,
-                                "power_save_duration_minutes": opts.duration,
-                                "enable_power_save": True
-                            })
-                    else:
-                        # duration of 0 not allowed, even when disabled
-                        request = request_class(dish_power_save={
-                            "power_save_duration_minutes": 1,
-                            "enable_power_save": False
+            opts.stub = stub
+            opts.request_class = request_class
+        else:
+            stub = opts.stub
+            request_class = opts.request_class
+        if opts.command == "reboot":
+            request = request_class(reboot={})
+        elif opts.command == "stow":
+            request = request_class(dish_stow={})
+        elif opts.command == "unstow":
+            request = request_class(dish_stow={"unstow": True})
+        elif opts.command == "set_sleep":
+            if opts.start is None and opts.duration is None:
+                request = request_class(dish_get_config={})
+            else:
+                if opts.duration:
+                    request = request_class(
+                        dish_power_save={
+                            "power_save_start_minutes": opts.start,
+                            "power_save_duration_minutes": opts.duration,
+                            "enable_power_save": True
                         })
-            elif opts.command == "set_gps":
-                if opts.enable is None:
-                    request = request_class(get_status={})
                 else:
-                    request = request_class(dish_inhibit_gps={"inhibit_gps": not opts.enable})
-
-            response = stub.Handle(request, timeout=10)
-
-            if opts.command == "set_sleep" and opts.start is None and opts.duration is None:
-                config = response.dish_get_config.dish_config
-                if config.power_save_mode:
-                    print("Sleep start:", config.power_save_start_minutes,
-                          "minutes past midnight UTC")
-                    print("Sleep duration:", config.power_save_duration_minutes, "minutes")
-                else:
-                    print("Sleep disabled")
-            elif opts.command == "set_gps" and opts.enable is None:
-                status = response.dish_get_status
-                if status.gps_stats.inhibit_gps:
-                    print("GPS disabled")
-                else:
-                    print("GPS enabled")
+                    # duration of 0 not allowed, even when disabled
+                    request = request_class(dish_power_save={
+                        "power_save_duration_minutes": 1,
+                        "enable_power_save": False
+                    })
+        elif opts.command == "set_gps":
+            if opts.enable is None:
+                request = request_class(get_status={})
+            else:
+                request = request_class(dish_inhibit_gps={"inhibit_gps": not opts.enable})
+
+        response = stub.Handle(request, timeout=10)
+
+        if opts.command == "set_sleep" and opts.start is None and opts.duration is None:
+            config = response.dish_get_config.dish_config
+            if config.power_save_mode:
+                print("Sleep start:", config.power_save_start_minutes,
+                      "minutes past midnight UTC")
+                print("Sleep duration:", config.power_save_duration_minutes, "minutes")
+            else:
+                print("Sleep disabled")
+        elif opts.command == "set_gps" and opts.enable is None:
+            status = response.dish_get_status
+            if status.gps_stats.inhibit_gps:
+                print("GPS disabled")
+            else:
+                print("GPS enabled")
     except (AttributeError, ValueError, grpc.RpcError) as e:
         if isinstance(e, grpc.Call):
             msg = e.details()
@@ -127,7 +135,13 @@ def main():
 
     logging.basicConfig(format="%(levelname)s: %(message)s")
 
-    rc = loop_util.run_loop(opts, loop_body, opts)
+    opts.stub = None
+    opts.request_class = None
+    channel = grpc.insecure_channel(opts.target)
+    try:
+        rc = loop_util.run_loop(opts, loop_body, opts, channel)
+    finally:
+        channel.close()
     sys.exit(rc)
 
 
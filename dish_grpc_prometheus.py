@@ -11,6 +11,7 @@ import logging
 import signal
 import sys
 import threading
+import time
 
 import dish_common
 
@@ -25,18 +26,12 @@ def handle_sigterm(signum, frame):
 
 
 class MetricInfo:
-    unit = ""
-    kind = "gauge"
-    help = ""
+    __slots__ = ("unit", "kind", "help")
 
     def __init__(self, unit=None, kind=None, help=None) -> None:
-        if unit:
-            self.unit = f"_{unit}"
-        if kind:
-            self.kind = kind
-        if help:
-            self.help = help
-        pass
+        self.unit = f"_{unit}" if unit else ""
+        self.kind = kind if kind else "gauge"
+        self.help = help if help else ""
 
 
 METRICS_INFO = {
@@ -81,6 +76,24 @@ METRICS_INFO = {
     "usage_upload_usage": MetricInfo(unit="bytes", kind="counter"),
 }
 
+# Everything in the output for these metrics other than the value and
+# timestamp is fixed, so the text that precedes the value is built up front.
+METRICS_INFO_PREFIXES = tuple(
+    (name, (f"# HELP starlink_{name}{info.unit} {info.help}\n"
+            f"# TYPE starlink_{name}{info.unit} {info.kind}\n"
+            f"starlink_{name}{info.unit} ").encode()) for name, info in METRICS_INFO.items())
+
+INFO_HEADER = b"# HELP starlink_info \n# TYPE starlink_info gauge\n"
+INFO_METRICS = (
+    ("status_id", "id"),
+    ("status_hardware_version", "hardware_version"),
+    ("status_software_version", "software_version"),
+)
+
+# Marker for metrics that were not reported at all, as distinct from ones
+# reported with a value of None
+MISSING = object()
+
 STATE_VALUES = [
     "UNKNOWN",
     "CONNECTED",
@@ -95,6 +108,15 @@ STATE_VALUES = [
     "DISH_UNREACHABLE",
 ]
 
+LABEL_VALUE_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+# Only one of these lines will have value 1 per scrape, so the state metric is
+# emitted from prebuilt pieces rather than as generic Metric objects.
+STATE_HEADER = b"# HELP starlink_status_state \n# TYPE starlink_status_state gauge\n"
+STATE_LINE_PREFIXES = tuple(
+    (state_value, f'starlink_status_state{{state="{state_value}"}} '.encode())
+    for state_value in STATE_VALUES)
+
 
 class Metric:
     name = ""
@@ -121,11 +143,25 @@ class Metric:
         lines = []
         lines.append(f"# HELP {self.name} {self.help}")
         lines.append(f"# TYPE {self.name} {self.kind}")
+        ts_ms = self.timestamp * 1000
         for value in self.values:
-            lines.append(f"{self.name}{value} {self.timestamp*1000}")
+            lines.append(f"{self.name}{value} {ts_ms}")
         lines.append("")
         return str.join("\n", lines)
 
+    def write(self, buf):
+        """Append this metric, encoded for an HTTP response body, to buf."""
+        if not self.values:
+            return
+
+        buf.extend(f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n".encode())
+        name = self.name.encode()
+        ts_suffix = f" {self.timestamp * 1000}\n".encode()
+        for value in self.values:
+            buf.extend(name)
+            buf.extend(str(value).encode())
+            buf.extend(ts_suffix)
+
 
 class MetricValue:
     value = 0
@@ -136,11 +172,20 @@ class MetricValue:
         self.labels = labels
 
     def __str__(self):
-        label_str = ""
-        if self.labels:
-            label_str = ("{" + str.join(",", [f'{v[0]}="{v[1]}"'
-                                              for v in self.labels.items()]) + "}")
-        return f"{label_str} {self.value}"
+        if not self.labels:
+            return f" {self.value}"
+        if len(self.labels) == 1:
+            key, label_value = next(iter(self.labels.items()))
+            return f'{{{key}="{escape_label_value(label_value)}"}} {self.value}'
+        label_str = str.join(",",
+                             (f'{key}="{escape_label_value(label_value)}"'
+                              for key, label_value in self.labels.items()))
+        return f"{{{label_str}}} {self.value}"
+
+
+def escape_label_value(value):
+    """Escape a label value as required by the Prometheus text format."""
+    return str(value).translate(LABEL_VALUE_ESCAPES)
 
 
 def parse_args():
@@ -150,13 +195,17 @@ def parse_args():
     group = parser.add_argument_group(title="HTTP server options")
     group.add_argument("--address", default="0.0.0.0", help="IP address to listen on")
     group.add_argument("--port", default=8080, type=int, help="Port to listen on")
+    group.add_argument("--min-poll-interval",
+                       default=0.0,
+                       type=float,
+                       help="Minimum time in seconds between polls of the dish; requests that "
+                       "arrive sooner than this after the last poll are served the data from "
+                       "that poll, default: 0 (poll on every request)")
 
     return dish_common.run_arg_parser(parser, modes=["status", "alert_detail", "usage", "location"])
 
 
 def prometheus_export(opts, gstate):
-    raw_data = {}
-
     def data_add_item(name, value, category):
         raw_data[category + "_" + name] = value
         pass
@@ -165,85 +214,79 @@ def prometheus_export(opts, gstate):
         raise NotImplementedError("Did not expect sequence data")
 
     with gstate.lock:
-        rc, status_ts, hist_ts = dish_common.get_data(opts, gstate, data_add_item,
-                                                      data_add_sequencem)
-
-    metrics = []
+        now = time.monotonic()
+        if gstate.raw_data is None or now - gstate.poll_time >= opts.min_poll_interval:
+            raw_data = {}
+            rc, status_ts, hist_ts = dish_common.get_data(opts, gstate, data_add_item,
+                                                          data_add_sequencem)
+            gstate.raw_data = raw_data
+            gstate.status_ts = status_ts
+            gstate.poll_time = now
+        # Entries get removed from this as they are processed, so work on a
+        # copy in case it gets reused for a subsequent request.
+        raw_data = gstate.raw_data.copy()
+        status_ts = gstate.status_ts
+
+    buf = bytearray()
 
     # snr is not supported by starlink any more but still returned by the grpc
     # service for backwards compatibility
-    if "status_snr" in raw_data:
-        del raw_data["status_snr"]
-
-    metrics.append(
-        Metric(
-            name="starlink_status_state",
-            timestamp=status_ts,
-            values=[
-                MetricValue(
-                    value=int(raw_data["status_state"] == state_value),
-                    labels={"state": state_value},
-                ) for state_value in STATE_VALUES
-            ],
-        ))
-    del raw_data["status_state"]
-
-    info_metrics = ["status_id", "status_hardware_version", "status_software_version"]
+    raw_data.pop("status_snr", None)
+
+    state = raw_data.pop("status_state")
+    ts_suffix = f" {status_ts*1000}\n".encode()
+    buf.extend(STATE_HEADER)
+    for state_value, prefix in STATE_LINE_PREFIXES:
+        buf.extend(prefix)
+        buf.extend(b"1" if state_value == state else b"0")
+        buf.extend(ts_suffix)
+
     metrics_not_found = []
-    metrics_not_found.extend([x for x in info_metrics if x not in raw_data])
-
-    if len(metrics_not_found) < len(info_metrics):
-        metrics.append(
-            Metric(
-                name="starlink_info",
-                timestamp=status_ts,
-                values=[
-                    MetricValue(
-                        value=1,
-                        labels={
-                            x.replace("status_", ""): raw_data.pop(x) for x in info_metrics
-                            if x in raw_data
-                        },
-                    )
-                ],
-            ))
-
-    for name, metric_info in METRICS_INFO.items():
-        if name in raw_data:
-            metrics.append(
-                Metric(
-                    name=f"starlink_{name}{metric_info.unit}",
-                    timestamp=status_ts,
-                    kind=metric_info.kind,
-                    values=[MetricValue(value=float(raw_data.pop(name) or 0))],
-                ))
+    info_labels = []
+    for name, label in INFO_METRICS:
+        value = raw_data.pop(name, MISSING)
+        if value is MISSING:
+            metrics_not_found.append(name)
         else:
+            info_labels.append(f'{label}="{escape_label_value(value)}"')
+
+    if info_labels:
+        buf.extend(INFO_HEADER)
+        buf.extend(f"starlink_info{{{','.join(info_labels)}}} 1".encode())
+        buf.extend(ts_suffix)
+
+    for name, prefix in METRICS_INFO_PREFIXES:
+        value = raw_data.pop(name, MISSING)
+        if value is MISSING:
             metrics_not_found.append(name)
+        else:
+            buf.extend(prefix)
+            buf.extend(str(float(value or 0)).encode())
+            buf.extend(ts_suffix)
 
-    metrics.append(
-        Metric(
-            name="starlink_exporter_unprocessed_metrics",
-            timestamp=status_ts,
-            values=[MetricValue(value=1, labels={"metric": name}) for name in raw_data],
-        ))
+    write_metric_names(buf, "starlink_exporter_unprocessed_metrics", raw_data, ts_suffix)
+    write_metric_names(buf, "starlink_exporter_missing_metrics", metrics_not_found, ts_suffix)
 
-    metrics.append(
-        Metric(
-            name="starlink_exporter_missing_metrics",
-            timestamp=status_ts,
-            values=[MetricValue(
-                value=1,
-                labels={"metric": name},
-            ) for name in metrics_not_found],
-        ))
+    return buf
 
-    return str.join("\n", [str(metric) for metric in metrics])
+
+def write_metric_names(buf, metric_name, names, ts_suffix):
+    if not names:
+        return
+
+    buf.extend(f"# HELP {metric_name} \n# TYPE {metric_name} gauge\n".encode())
+    for name in names:
+        buf.extend(f'{metric_name}{{metric="{escape_label_value(name)}"}} 1'.encode())
+        buf.extend(ts_suffix)
 
 
 class MetricsRequestHandler(BaseHTTPRequestHandler):
+    # Anything else, such as browser requests for /favicon.ico or stray
+    # probes, gets a 404 instead of triggering a data fetch from the dish.
+    metrics_paths = frozenset(("/", "/metrics"))
+
     def do_GET(self):
-        path = self.path.partition("?")[0]
-        if path.lower() == "/favicon.ico":
+        if self.path.partition("?")[0] not in self.metrics_paths:
             self.send_error(HTTPStatus.NOT_FOUND)
             return
 
@@ -255,7 +298,7 @@ class MetricsRequestHandler(BaseHTTPRequestHandler):
         self.send_header("Content-type", "text/plain")
         self.send_header("Content-Length", len(content))
         self.end_headers()
-        self.wfile.write(content.encode())
+        self.wfile.write(content)
 
 
 def main():
@@ -265,6 +308,9 @@ def main():
 
     gstate = dish_common.GlobalState(target=opts.target)
     gstate.lock = threading.Lock()
+    gstate.raw_data = None
+    gstate.status_ts = None
+    gstate.poll_time = 0.0
 
     httpd = ThreadingHTTPServer((opts.address, opts.port), MetricsRequestHandler)
     httpd.daemon_threads = False
@@ -28,6 +28,10 @@ around this rare occurrence, you can pass the -f option to force a schema
 update. Alternatively, instead of using the alert_detail mode, you can use the
 alerts bitmask in the status group.
 
+The database is switched to write-ahead logging (WAL) journal mode, so expect
+to see "-wal" and "-shm" files alongside the database file while the script
+is running.
+
 NOTE: The Starlink user terminal does not include time values with its
 history or status data, so this script uses current system time to compute
 the timestamps it writes into the database. It is recommended to run this
@@ -39,6 +43,7 @@ from datetime import datetime
 from datetime import timezone
 from itertools import repeat
 import logging
+from operator import itemgetter
 import signal
 import sqlite3
 import sys
@@ -48,6 +53,10 @@ import dish_common
 import starlink_grpc
 
 SCHEMA_VERSION = 5
+MMAP_SIZE = 64 * 1024 * 1024
+CONVERT_BATCH_SIZE = 10000
+COUNTER_QUERY = ('SELECT "time", "{0}" FROM "{1}" WHERE "time"<? AND "id"=? '
+                 'ORDER BY "time" DESC LIMIT 1')
 
 
 class Terminated(Exception):
@@ -84,12 +93,12 @@ def parse_args():
 
 def query_counter(opts, gstate, column, table):
     now = time.time()
-    cur = gstate.sql_conn.cursor()
-    cur.execute(
-        'SELECT "time", "{0}" FROM "{1}" WHERE "time"<? AND "id"=? '
-        'ORDER BY "time" DESC LIMIT 1'.format(column, table), (now, gstate.dish_id))
-    row = cur.fetchone()
-    cur.close()
+    key = (column, table)
+    sql = gstate.counter_sql.get(key)
+    if sql is None:
+        sql = COUNTER_QUERY.format(column, table)
+        gstate.counter_sql[key] = sql
+    row = gstate.sql_conn.execute(sql, (now, gstate.dish_id)).fetchone()
 
     if row and row[0] and row[1]:
         if opts.verbose:
@@ -100,28 +109,44 @@ def query_counter(opts, gstate, column, table):
         return 0, None
 
 
+def insert_sql(gstate, table, columns):
+    # The set of columns written per table does not normally change from one
+    # loop iteration to the next, so the same SQL text gets reused, which also
+    # lets sqlite3's statement cache skip re-preparing it.
+    key = (table, columns)
+    sql = gstate.insert_sql.get(key)
+    if sql is None:
+        sql = 'INSERT OR REPLACE INTO "{0}" ({1}) VALUES ({2})'.format(
+            table, ",".join('"' + x + '"' for x in columns), ",".join(repeat("?", len(columns))))
+        gstate.insert_sql[key] = sql
+    return sql
+
+
 def loop_body(opts, gstate, shutdown=False):
-    tables = {"status": {}, "ping_stats": {}, "usage": {}, "power": {}}
-    hist_cols = ["time", "id"]
-    hist_rows = []
+    # These are kept on gstate and reused across loop iterations.
+    tables = gstate.tables
+    for fields in tables.values():
+        fields.clear()
+    hist_cols = gstate.hist_cols
+    hist_rows = gstate.hist_rows
+    hist_rows.clear()
 
     def cb_add_item(key, val, category):
         tables[category][key] = val
 
     def cb_add_sequence(key, val, category, start):
-        tables[category][key] = ",".join(str(subv) if subv is not None else "" for subv in val)
+        if None in val:
+            tables[category][key] = ",".join(str(subv) if subv is not None else "" for subv in val)
+        else:
+            tables[category][key] = ",".join(map(str, val))
 
     def cb_add_bulk(bulk, count, timestamp, counter):
         if len(hist_cols) == 2:
             hist_cols.extend(bulk.keys())
             hist_cols.append("counter")
-        for i in range(count):
-            timestamp += 1
-            counter += 1
-            row = [timestamp, gstate.dish_id]
-            row.extend(val[i] for val in bulk.values())
-            row.append(counter)
-            hist_rows.append(row)
+        dish_id = gstate.dish_id
+        hist_rows.extend((timestamp + i + 1, dish_id, *sample, counter + i + 1)
+                         for i, sample in enumerate(zip(*bulk.values())))
 
     rc = 0
     status_ts = None
@@ -150,18 +175,14 @@ def loop_body(opts, gstate, shutdown=False):
         for category, fields in tables.items():
             if fields:
                 timestamp = status_ts if category == "status" else hist_ts
-                sql = 'INSERT OR REPLACE INTO "{0}" ("time","id",{1}) VALUES ({2})'.format(
-                    category, ",".join('"' + x + '"' for x in fields),
-                    ",".join(repeat("?",
-                                    len(fields) + 2)))
+                sql = insert_sql(gstate, category, ("time", "id", *fields))
                 values = [timestamp, gstate.dish_id]
                 values.extend(fields.values())
                 cur.execute(sql, values)
                 rows_written += 1
 
         if hist_rows:
-            sql = 'INSERT OR REPLACE INTO "history" ({0}) VALUES({1})'.format(
-                ",".join('"' + x + '"' for x in hist_cols), ",".join(repeat("?", len(hist_cols))))
+            sql = insert_sql(gstate, "history", tuple(hist_cols))
             cur.executemany(sql, hist_rows)
             rows_written += len(hist_rows)
 
@@ -178,6 +199,16 @@ def loop_body(opts, gstate, shutdown=False):
     return rc
 
 
+def set_pragmas(conn):
+    # This script writes a handful of rows per loop iteration for as long as
+    # it runs, so favor write latency: WAL journal avoids rewriting a rollback
+    # journal on every commit and only needs NORMAL sync to stay consistent.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size={0}".format(MMAP_SIZE))
+
+
 def ensure_schema(opts, conn, context):
     cur = conn.cursor()
     cur.execute("PRAGMA user_version")
@@ -238,29 +269,31 @@ def create_tables(conn, context, suffix):
         raise TypeError
 
     column_info = {}
-    cur = conn.cursor()
+    statements = ["BEGIN EXCLUSIVE"]
     for table, group_pairs in tables.items():
         column_names = ["time", "id"]
         columns = ['"time" INTEGER NOT NULL', '"id" TEXT NOT NULL']
         for name_group, type_group in group_pairs:
             for name_item, type_item in zip(name_group, type_group):
-                name_item = dish_common.BRACKETS_RE.match(name_item).group(1)
+                name_item = name_item.partition("[")[0]
                 if name_item != "id":
                     columns.append('"{0}" {1}'.format(name_item, sql_type(type_item)))
                     column_names.append(name_item)
-        cur.execute('DROP TABLE IF EXISTS "{0}{1}"'.format(table, suffix))
-        sql = 'CREATE TABLE "{0}{1}" ({2}, PRIMARY KEY("time","id"))'.format(
-            table, suffix, ", ".join(columns))
-        cur.execute(sql)
+        statements.append('DROP TABLE IF EXISTS "{0}{1}"'.format(table, suffix))
+        statements.append('CREATE TABLE "{0}{1}" ({2}, PRIMARY KEY("time","id"))'.format(
+            table, suffix, ", ".join(columns)))
         column_info[table] = column_names
-    cur.close()
+
+    # The transaction is intentionally left open here, so that the caller's
+    # commit covers the new tables along with any data conversion and the
+    # schema version update.
+    conn.executescript(";\n".join(statements) + ";")
 
     return column_info
 
 
 def convert_tables(conn, context):
     new_column_info = create_tables(conn, context, "_new")
-    conn.row_factory = sqlite3.Row
     old_cur = conn.cursor()
     new_cur = conn.cursor()
     for table, new_columns in new_column_info.items():
@@ -270,17 +303,23 @@ def convert_tables(conn, context):
         except sqlite3.OperationalError:
             table_ok = False
         if table_ok:
-            old_columns = set(x[0] for x in old_cur.description)
+            old_columns = {x[0]: i for i, x in enumerate(old_cur.description)}
             new_columns = tuple(x for x in new_columns if x in old_columns)
+            # new_columns always includes at least "time" and "id", so this
+            # will return a tuple
+            get_values = itemgetter(*(old_columns[x] for x in new_columns))
             sql = 'INSERT OR REPLACE INTO "{0}_new" ({1}) VALUES ({2})'.format(
                 table, ",".join('"' + x + '"' for x in new_columns),
                 ",".join(repeat("?", len(new_columns))))
-            new_cur.executemany(sql, (tuple(row[col] for col in new_columns) for row in old_cur))
+            while True:
+                rows = old_cur.fetchmany(CONVERT_BATCH_SIZE)
+                if not rows:
+                    break
+                new_cur.executemany(sql, map(get_values, rows))
             new_cur.execute('DROP TABLE "{0}"'.format(table))
         new_cur.execute('ALTER TABLE "{0}_new" RENAME TO "{0}"'.format(table))
     old_cur.close()
     new_cur.close()
-    conn.row_factory = None
 
 
 def main():
@@ -289,14 +328,18 @@ def main():
     logging.basicConfig(format="%(levelname)s: %(message)s")
 
     gstate = dish_common.GlobalState(target=opts.target)
-    gstate.points = []
-    gstate.deferred_points = []
+    gstate.tables = {"status": {}, "ping_stats": {}, "usage": {}, "power": {}}
+    gstate.hist_cols = ["time", "id"]
+    gstate.hist_rows = []
+    gstate.insert_sql = {}
+    gstate.counter_sql = {}
 
     signal.signal(signal.SIGTERM, handle_sigterm)
     gstate.sql_conn = sqlite3.connect(opts.database)
 
     rc = 0
     try:
+        set_pragmas(gstate.sql_conn)
         rc = ensure_schema(opts, gstate.sql_conn, gstate.context)
         if rc:
             sys.exit(rc)
@@ -11,7 +11,9 @@ order in the output can change with the dish software. Instead of using
 the alert_detail mode, you can use the alerts bitmask in the status group.
 """
 
-from datetime import datetime
+import csv
+from functools import lru_cache
+from itertools import chain
 import logging
 import os
 import signal
@@ -22,42 +24,10 @@ import dish_common
 import starlink_grpc
 
 COUNTER_FIELD = "end_counter"
-VERBOSE_FIELD_MAP = {
-    # status fields (the remainder are either self-explanatory or I don't
-    # know with confidence what they mean)
-    "alerts": "Alerts bit field",
-
-    # ping_drop fields
-    "samples": "Parsed samples",
-    "end_counter": "Sample counter",
-    "total_ping_drop": "Total ping drop",
-    "count_full_ping_drop": "Count of drop == 1",
-    "count_obstructed": "Obstructed",
-    "total_obstructed_ping_drop": "Obstructed ping drop",
-    "count_full_obstructed_ping_drop": "Obstructed drop == 1",
-    "count_unscheduled": "Unscheduled",
-    "total_unscheduled_ping_drop": "Unscheduled ping drop",
-    "count_full_unscheduled_ping_drop": "Unscheduled drop == 1",
-
-    # ping_run_length fields
-    "init_run_fragment": "Initial drop run fragment",
-    "final_run_fragment": "Final drop run fragment",
-    "run_seconds": "Per-second drop runs",
-    "run_minutes": "Per-minute drop runs",
-
-    # ping_latency fields
-    "mean_all_ping_latency": "Mean RTT, drop < 1",
-    "deciles_all_ping_latency": "RTT deciles, drop < 1",
-    "mean_full_ping_latency": "Mean RTT, drop == 0",
-    "deciles_full_ping_latency": "RTT deciles, drop == 0",
-    "stdev_full_ping_latency": "RTT standard deviation, drop == 0",
-
-    # ping_loaded_latency is still experimental, so leave those unexplained
-
-    # usage fields
-    "download_usage": "Bytes downloaded",
-    "upload_usage": "Bytes uploaded",
-}
+# Output is flushed at the end of each loop iteration, so this just needs to
+# be large enough to hold the output from one, including bulk history rows.
+OUT_BUFFER_SIZE = 64 * 1024
+TAIL_BLOCK_SIZE = 8192
 
 
 class Terminated(Exception):
@@ -110,28 +80,37 @@ def parse_args():
 def open_out_file(opts, mode):
     if opts.out_file == "-":
         # open new file, so it can be closed later without affecting sys.stdout
-        return os.fdopen(sys.stdout.fileno(), "w", buffering=1, closefd=False)
-    return open(opts.out_file, mode, buffering=1)
+        return os.fdopen(sys.stdout.fileno(),
+                         "w",
+                         buffering=OUT_BUFFER_SIZE,
+                         encoding="utf-8",
+                         closefd=False)
+    return open(opts.out_file, mode, buffering=OUT_BUFFER_SIZE, encoding="utf-8")
+
+
+@lru_cache(maxsize=None)
+def expand_header_name(name):
+    """Return a tuple of the CSV column names for a field name."""
+    name, start, end = dish_common.parse_field_name(name)
+    if start:
+        return tuple(name + "_" + str(x) for x in range(int(start), int(end)))
+    elif end:
+        return tuple(name + "_" + str(x) for x in range(int(end)))
+    else:
+        return (name,)
 
 
-def print_header(opts, print_file):
+def print_header(opts, gstate, print_file):
     header = ["datetimestamp_utc"]
 
     def header_add(names):
         for name in names:
-            name, start, end = dish_common.BRACKETS_RE.match(name).group(1, 4, 5)
-            if start:
-                header.extend(name + "_" + str(x) for x in range(int(start), int(end)))
-            elif end:
-                header.extend(name + "_" + str(x) for x in range(int(end)))
-            else:
-                header.append(name)
+            header.extend(expand_header_name(name))
 
     if opts.status_mode:
         if opts.pure_status_mode:
-            context = starlink_grpc.ChannelContext(target=opts.target)
             try:
-                name_groups = starlink_grpc.status_field_names(context=context)
+                name_groups = starlink_grpc.status_field_names(context=gstate.context)
             except starlink_grpc.GrpcError as e:
                 dish_common.conn_error(opts, "Failure reflecting status field names: %s", str(e))
                 return 1
@@ -150,20 +129,9 @@ def print_header(opts, print_file):
 
     if opts.history_stats_mode:
         groups = starlink_grpc.history_stats_field_names()
-        general, ping, runlen, latency, loaded, usage, power = groups[0:7]
-        header_add(general)
-        if "ping_drop" in opts.mode:
-            header_add(ping)
-        if "ping_run_length" in opts.mode:
-            header_add(runlen)
-        if "ping_latency" in opts.mode:
-            header_add(latency)
-        if "ping_loaded_latency" in opts.mode:
-            header_add(loaded)
-        if "usage" in opts.mode:
-            header_add(usage)
-        if "power" in opts.mode:
-            header_add(power)
+        header_add(groups[0])
+        for index, category in opts.history_stats_groups:
+            header_add(groups[index])
 
     print(",".join(header), file=print_file)
     return 0
@@ -175,63 +143,117 @@ def get_prior_counter(opts, gstate):
     # it would be better not to make them. However, it also only works if the
     # CSV file has a header that correctly matches the last line of the file,
     # and there's really no way to verify that, so it's garbage in, garbage
-    # out, anyway. It also reads the entire file line-by-line, which is not
-    # great.
+    # out, anyway.
     try:
-        with open_out_file(opts, "r") as csv_file:
-            header = csv_file.readline().split(",")
+        with open(opts.out_file, "rb") as csv_file:
+            header = csv_file.readline().decode().split(",")
             column = header.index(COUNTER_FIELD)
-            last_line = None
-            for last_line in csv_file:
-                pass
+            last_line = read_last_line(csv_file)
         if last_line is not None:
             gstate.counter_stats = int(last_line.split(",")[column])
     except (IndexError, OSError, ValueError):
         pass
 
 
+def read_last_line(in_file):
+    """Return the last non-empty line of a file opened in binary mode.
+
+    This reads backwards from the end of the file in blocks rather than
+    reading through the whole file. Returns None if the file has only one
+    line.
+    """
+    in_file.seek(0, os.SEEK_END)
+    size = in_file.tell()
+    block_size = TAIL_BLOCK_SIZE
+    while True:
+        start = max(0, size - block_size)
+        in_file.seek(start)
+        data = in_file.read(size - start).rstrip(b"\r\n")
+        index = data.rfind(b"\n")
+        if index >= 0:
+            return data[index + 1:].decode()
+        if start == 0:
+            return None
+        block_size *= 2
+
+
+def iso_timestamp(timestamp):
+    """Return the ISO format UTC time string for an integer timestamp.
+
+    This produces the same result as datetime.utcfromtimestamp(timestamp)
+    followed by isoformat(), but without creating a datetime object.
+    """
+    t = time.gmtime(timestamp)
+    return (f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+            f"T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}")
+
+
+def iso_timestamps(start, count):
+    """Generate ISO format UTC time strings for count consecutive seconds.
+
+    Only the seconds change within each minute, so the date and time up to
+    the minute is formatted once per minute instead of once per second.
+    """
+    end = start + count
+    while start < end:
+        t = time.gmtime(start)
+        prefix = (f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+                  f"T{t.tm_hour:02d}:{t.tm_min:02d}:")
+        stop = min(60, t.tm_sec + end - start)
+        for second in range(t.tm_sec, stop):
+            yield f"{prefix}{second:02d}"
+        start += stop - t.tm_sec
+
+
 def loop_body(opts, gstate, print_file, shutdown=False):
-    csv_data = []
+    # These are kept on gstate and reused across loop iterations.
+    csv_data = gstate.csv_data
+    csv_data.clear()
+    writer = gstate.csv_writer
 
     def xform(val):
         return "" if val is None else str(val)
 
+    def xform_seq(val):
+        if None in val:
+            return ", ".join(xform(subval) for subval in val)
+        return ", ".join(map(str, val))
+
+    def cb_verbose_add_item(name, val, category):
+        csv_data.append(dish_common.verbose_label(name) + xform(val))
+
+    def cb_verbose_add_sequence(name, val, category, start):
+        csv_data.append(dish_common.verbose_label(name) + xform_seq(val))
+
+    def cb_verbose_add_bulk(bulk, count, timestamp, counter):
+        print("Time range (UTC):      {0} -> {1}".format(
+            iso_timestamp(timestamp), iso_timestamp(timestamp + count)),
+              file=print_file)
+        for key, val in bulk.items():
+            print("{0:22} {1}".format(key + ":", xform_seq(val)), file=print_file)
+        if opts.loop_interval > 0.0:
+            print(file=print_file)
+
+    # csv.writer writes None as an empty field, same as xform, so the CSV
+    # call backs can just pass the values through as-is.
     def cb_data_add_item(name, val, category):
-        if opts.verbose:
-            csv_data.append("{0:22} {1}".format(
-                VERBOSE_FIELD_MAP.get(name, name) + ":", xform(val)))
+        # special case for get_status failure: this will be the lone item added
+        if name == "state" and val == "DISH_UNREACHABLE":
+            csv_data.extend(["", "", "", val])
         else:
-            # special case for get_status failure: this will be the lone item added
-            if name == "state" and val == "DISH_UNREACHABLE":
-                csv_data.extend(["", "", "", val])
-            else:
-                csv_data.append(xform(val))
+            csv_data.append(val)
 
     def cb_data_add_sequence(name, val, category, start):
-        if opts.verbose:
-            csv_data.append("{0:22} {1}".format(
-                VERBOSE_FIELD_MAP.get(name, name) + ":",
-                ", ".join(xform(subval) for subval in val)))
-        else:
-            csv_data.extend(xform(subval) for subval in val)
+        csv_data.extend(val)
 
     def cb_add_bulk(bulk, count, timestamp, counter):
-        if opts.verbose:
-            print("Time range (UTC):      {0} -> {1}".format(
-                datetime.utcfromtimestamp(timestamp).isoformat(),
-                datetime.utcfromtimestamp(timestamp + count).isoformat()),
-                  file=print_file)
-            for key, val in bulk.items():
-                print("{0:22} {1}".format(key + ":", ", ".join(xform(subval) for subval in val)),
-                      file=print_file)
-            if opts.loop_interval > 0.0:
-                print(file=print_file)
-        else:
-            for i in range(count):
-                timestamp += 1
-                fields = [datetime.utcfromtimestamp(timestamp).isoformat()]
-                fields.extend([xform(val[i]) for val in bulk.values()])
-                print(",".join(fields), file=print_file)
+        timestamps = iso_timestamps(timestamp + 1, count)
+        writer.writerows(zip(timestamps, *bulk.values()))
+
+    if opts.verbose:
+        cb_data_add_item = cb_verbose_add_item
+        cb_data_add_sequence = cb_verbose_add_sequence
+        cb_add_bulk = cb_verbose_add_bulk
 
     rc, status_ts, hist_ts = dish_common.get_data(opts,
                                                   gstate,
@@ -248,8 +270,9 @@ def loop_body(opts, gstate, print_file, shutdown=False):
     else:
         if csv_data:
             timestamp = status_ts if status_ts is not None else hist_ts
-            csv_data.insert(0, datetime.utcfromtimestamp(timestamp).isoformat())
-            print(",".join(csv_data), file=print_file)
+            writer.writerow(chain((iso_timestamp(timestamp),), csv_data))
+
+    print_file.flush()
 
     return rc
 
@@ -259,16 +282,20 @@ def main():
 
     logging.basicConfig(format="%(levelname)s: %(message)s")
 
+    gstate = dish_common.GlobalState(target=opts.target)
+    gstate.csv_data = []
+
     if opts.print_header:
         try:
             with open_out_file(opts, "a") as print_file:
-                rc = print_header(opts, print_file)
+                rc = print_header(opts, gstate, print_file)
         except OSError as e:
             logging.error("Failed opening output file: %s", str(e))
             rc = 1
+        finally:
+            gstate.shutdown()
         sys.exit(rc)
 
-    gstate = dish_common.GlobalState(target=opts.target)
     if opts.out_file != "-" and not opts.skip_query and opts.history_stats_mode:
         get_prior_counter(opts, gstate)
 
@@ -277,6 +304,7 @@ def main():
     except OSError as e:
         logging.error("Failed opening output file: %s", str(e))
         sys.exit(1)
+    gstate.csv_writer = csv.writer(print_file, lineterminator="\n")
     signal.signal(signal.SIGTERM, handle_sigterm)
 
     rc = 0
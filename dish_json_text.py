@@ -12,19 +12,23 @@ it will print the results in CSV format.
 
 import argparse
 from datetime import datetime
-from datetime import timezone
 import logging
-import re
 import sys
 import time
 
 import starlink_json
 
-BRACKETS_RE = re.compile(r"([^[]*)(\[((\d+),|)(\d*)\]|)$")
 SAMPLES_DEFAULT = 3600
-HISTORY_STATS_MODES = [
-    "ping_drop", "ping_run_length", "ping_latency", "ping_loaded_latency", "usage"
-]
+# History stats modes, with the index of each one's data group in the
+# history stats results, in output order
+HISTORY_STATS_GROUPS = (
+    ("ping_drop", 1),
+    ("ping_run_length", 2),
+    ("ping_latency", 3),
+    ("ping_loaded_latency", 4),
+    ("usage", 5),
+)
+HISTORY_STATS_MODES = [mode for mode, _ in HISTORY_STATS_GROUPS]
 VERBOSE_FIELD_MAP = {
     # ping_drop fields
     "samples": "Parsed samples",
@@ -59,6 +63,39 @@ VERBOSE_FIELD_MAP = {
 }
 
 
+def parse_field_name(key):
+    """Split a field name into base name and sequence start and end.
+
+    Returns:
+        A tuple of name, start, and end. The start and end values are strings,
+        with start being None if the name does not specify a sequence start
+        and end being None if the name does not indicate a sequence.
+    """
+    if not key.endswith("]"):
+        return key, None, None
+    name, _, seq = key[:-1].partition("[")
+    start, _, end = seq.rpartition(",")
+    return name, start or None, end
+
+
+# dish_grpc_text has one of these, too, but importing it would pull in
+# dish_common and the grpc modules, which this script does not use.
+def iso_timestamps(start, count):
+    """Generate ISO format UTC time strings for count consecutive seconds.
+
+    Only the seconds change within each minute, so strftime only needs to be
+    called once per minute.
+    """
+    end = start + count
+    while start < end:
+        t = time.gmtime(start)
+        prefix = time.strftime("%Y-%m-%dT%H:%M:", t)
+        stop = min(60, t.tm_sec + end - start)
+        for second in range(t.tm_sec, stop):
+            yield f"{prefix}{second:02d}"
+        start += stop - t.tm_sec
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         description="Collect status and/or history data from a Starlink user terminal and "
@@ -103,7 +140,10 @@ def parse_args():
     opts = parser.parse_args()
 
     # for convenience, set flags for whether any mode in a group is selected
-    opts.history_stats_mode = bool(set(HISTORY_STATS_MODES).intersection(opts.mode))
+    opts.history_stats_groups = [
+        index for mode, index in HISTORY_STATS_GROUPS if mode in opts.mode
+    ]
+    opts.history_stats_mode = bool(opts.history_stats_groups)
     opts.bulk_mode = "bulk_history" in opts.mode
 
     if opts.history_stats_mode and opts.bulk_mode:
@@ -124,7 +164,8 @@ def parse_args():
             except ValueError:
                 parser.error("Could not parse timestamp")
         if opts.verbose:
-            print("Using timestamp", datetime.fromtimestamp(opts.history_time, tz=timezone.utc))
+            print("Using timestamp",
+                  time.strftime("%Y-%m-%d %H:%M:%S+00:00", time.gmtime(opts.history_time)))
 
     return opts
 
@@ -134,7 +175,7 @@ def print_header(opts):
 
     def header_add(names):
         for name in names:
-            name, start, end = BRACKETS_RE.match(name).group(1, 4, 5)
+            name, start, end = parse_field_name(name)
             if start:
                 header.extend(name + "_" + str(x) for x in range(int(start), int(end)))
             elif end:
@@ -149,18 +190,9 @@ def print_header(opts):
 
     if opts.history_stats_mode:
         groups = starlink_json.history_stats_field_names()
-        general, ping, runlen, latency, loaded, usage = groups[0:6]
-        header_add(general)
-        if "ping_drop" in opts.mode:
-            header_add(ping)
-        if "ping_run_length" in opts.mode:
-            header_add(runlen)
-        if "ping_loaded_latency" in opts.mode:
-            header_add(loaded)
-        if "ping_latency" in opts.mode:
-            header_add(latency)
-        if "usage" in opts.mode:
-            header_add(usage)
+        header_add(groups[0])
+        for index in opts.history_stats_groups:
+            header_add(groups[index])
 
     print(",".join(header))
     return 0
@@ -169,7 +201,7 @@ def print_header(opts):
 def get_data(opts, add_item, add_sequence, add_bulk):
     def add_data(data):
         for key, val in data.items():
-            name, seq = BRACKETS_RE.match(key).group(1, 5)
+            name, start, seq = parse_field_name(key)
             if seq is None:
                 add_item(name, val)
             else:
@@ -181,18 +213,9 @@ def get_data(opts, add_item, add_sequence, add_bulk):
         except starlink_json.JsonError as e:
             logging.error("Failure getting history stats: %s", str(e))
             return 1
-        general, ping, runlen, latency, loaded, usage = groups[0:6]
-        add_data(general)
-        if "ping_drop" in opts.mode:
-            add_data(ping)
-        if "ping_run_length" in opts.mode:
-            add_data(runlen)
-        if "ping_latency" in opts.mode:
-            add_data(latency)
-        if "ping_loaded_latency" in opts.mode:
-            add_data(loaded)
-        if "usage" in opts.mode:
-            add_data(usage)
+        add_data(groups[0])
+        for index in opts.history_stats_groups:
+            add_data(groups[index])
 
     if opts.bulk_mode and add_bulk:
         timestamp = int(time.time()) if opts.history_time is None else opts.history_time
@@ -207,7 +230,7 @@ def get_data(opts, add_item, add_sequence, add_bulk):
         new_counter = general["end_counter"]
         if opts.verbose:
             print("Establishing time base: {0} -> {1}".format(
-                new_counter, datetime.fromtimestamp(timestamp, tz=timezone.utc)))
+                new_counter, time.strftime("%Y-%m-%d %H:%M:%S+00:00", time.gmtime(timestamp))))
         timestamp -= parsed_samples
 
         add_bulk(bulk, parsed_samples, timestamp, new_counter - parsed_samples)
@@ -220,7 +243,7 @@ def loop_body(opts):
         csv_data = []
     else:
         history_time = int(time.time()) if opts.history_time is None else opts.history_time
-        csv_data = [datetime.utcfromtimestamp(history_time).isoformat()]
+        csv_data = [time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(history_time))]
 
     def cb_data_add_item(name, val):
         if opts.verbose:
@@ -234,24 +257,27 @@ def loop_body(opts):
 
     def cb_data_add_sequence(name, val):
         if opts.verbose:
-            csv_data.append("{0:22} {1}".format(
-                VERBOSE_FIELD_MAP.get(name, name) + ":", ", ".join(str(subval) for subval in val)))
+            csv_data.append("{0:22} {1}".format(VERBOSE_FIELD_MAP.get(name, name) + ":",
+                                                ", ".join(map(str, val))))
         else:
-            csv_data.extend(str(subval) for subval in val)
+            csv_data.extend(map(str, val))
 
     def cb_add_bulk(bulk, count, timestamp, counter):
         if opts.verbose:
             print("Time range (UTC):      {0} -> {1}".format(
-                datetime.utcfromtimestamp(timestamp).isoformat(),
-                datetime.utcfromtimestamp(timestamp + count).isoformat()))
+                time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)),
+                time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp + count))))
             for key, val in bulk.items():
-                print("{0:22} {1}".format(key + ":", ", ".join(str(subval) for subval in val)))
+                print("{0:22} {1}".format(key + ":", ", ".join(map(str, val))))
         else:
-            for i in range(count):
-                timestamp += 1
-                fields = [datetime.utcfromtimestamp(timestamp).isoformat()]
-                fields.extend(["" if val[i] is None else str(val[i]) for val in bulk.values()])
-                print(",".join(fields))
+            lines = []
+            for row_time, row in zip(iso_timestamps(timestamp + 1, count), zip(*bulk.values())):
+                if None in row:
+                    row = ["" if val is None else val for val in row]
+                lines.append(row_time + "," + ",".join(map(str, row)))
+            if lines:
+                lines.append("")
+                sys.stdout.write("\n".join(lines))
 
     rc = get_data(opts, cb_data_add_item, cb_data_add_sequence, cb_add_bulk)
 
@@ -31,7 +31,8 @@ edge of the circle.
 """
 
 import argparse
-from datetime import datetime
+import io
+from itertools import chain
 import logging
 import os
 import png
@@ -49,6 +50,60 @@ DEFAULT_NO_DATA_GREYSCALE = "0000"
 LOOP_TIME_DEFAULT = 0
 
 
+class PixelCache(dict):
+    """Dict that maps SNR values to pixel bytes, computed on first lookup."""
+    def __init__(self, pixel_func):
+        super().__init__()
+        self.pixel_func = pixel_func
+
+    def __missing__(self, point):
+        pixel = self.pixel_func(point)
+        self[point] = pixel
+        return pixel
+
+
+def encode_image(opts, snr_data):
+    """Return the PNG image data for an obstruction map."""
+    channels = "g" if opts.greyscale else "rgb"
+    if not opts.no_alpha:
+        channels += "a"
+    color_pairs = tuple((getattr(opts, "unobstructed_color_" + channel),
+                         getattr(opts, "obstructed_color_" + channel)) for channel in channels)
+    no_data_pixel = bytes(getattr(opts, "no_data_color_" + channel) for channel in channels)
+
+    def pixel_bytes(point):
+        if point > 1.0:
+            # shouldn't happen, but just in case...
+            point = 1.0
+
+        if point >= 0.0:
+            return bytes(
+                round(point * unobstructed + (1.0-point) * obstructed)
+                for unobstructed, obstructed in color_pairs)
+        else:
+            return no_data_pixel
+
+    # The map typically has far fewer distinct values than points, and most
+    # of the points are usually no data, so only compute each value once.
+    pixels = PixelCache(pixel_bytes)
+
+    # Build the pixel data for the whole image in one go and hand it to the
+    # PNG writer as row views into that, rather than as separate row copies.
+    width = len(snr_data[0])
+    pixel_data = memoryview(b"".join(map(pixels.__getitem__, chain.from_iterable(snr_data))))
+    stride = width * len(channels)
+
+    writer = png.Writer(width,
+                        len(snr_data),
+                        alpha=(not opts.no_alpha),
+                        greyscale=opts.greyscale,
+                        compression=opts.compression)
+    image_file = io.BytesIO()
+    writer.write(image_file,
+                 (pixel_data[start:start + stride] for start in range(0, len(pixel_data), stride)))
+    return image_file.getvalue()
+
+
 def loop_body(opts, context):
     try:
         snr_data = starlink_grpc.obstruction_map(context)
@@ -56,35 +111,15 @@ def loop_body(opts, context):
         logging.error("Failed getting obstruction map data: %s", str(e))
         return 1
 
-    def pixel_bytes(row):
-        for point in row:
-            if point > 1.0:
-                # shouldn't happen, but just in case...
-                point = 1.0
+    if not snr_data or not snr_data[0]:
+        logging.error("Invalid SNR map data: Zero-length")
+        return 1
 
-            if point >= 0.0:
-                if opts.greyscale:
-                    yield round(point * opts.unobstructed_color_g +
-                                (1.0-point) * opts.obstructed_color_g)
-                else:
-                    yield round(point * opts.unobstructed_color_r +
-                                (1.0-point) * opts.obstructed_color_r)
-                    yield round(point * opts.unobstructed_color_g +
-                                (1.0-point) * opts.obstructed_color_g)
-                    yield round(point * opts.unobstructed_color_b +
-                                (1.0-point) * opts.obstructed_color_b)
-                if not opts.no_alpha:
-                    yield round(point * opts.unobstructed_color_a +
-                                (1.0-point) * opts.obstructed_color_a)
-            else:
-                if opts.greyscale:
-                    yield opts.no_data_color_g
-                else:
-                    yield opts.no_data_color_r
-                    yield opts.no_data_color_g
-                    yield opts.no_data_color_b
-                if not opts.no_alpha:
-                    yield opts.no_data_color_a
+    # The obstruction map changes slowly, so when looping, the data is
+    # frequently the same as last time. Reuse the encoded image in that case.
+    if snr_data != opts.last_snr_data:
+        opts.last_image = encode_image(opts, snr_data)
+        opts.last_snr_data = snr_data
 
     if opts.filename == "-":
         # Open new stdout file to get binary mode
@@ -92,18 +127,10 @@ def loop_body(opts, context):
     else:
         now = int(time.time())
         filename = opts.filename.replace("%u", str(now))
-        filename = filename.replace("%d",
-                                    datetime.utcfromtimestamp(now).strftime("%Y_%m_%d_%H_%M_%S"))
+        filename = filename.replace("%d", time.strftime("%Y_%m_%d_%H_%M_%S", time.gmtime(now)))
         filename = filename.replace("%s", str(opts.sequence))
         out_file = open(filename, "wb")
-    if not snr_data or not snr_data[0]:
-        logging.error("Invalid SNR map data: Zero-length")
-        return 1
-    writer = png.Writer(len(snr_data[0]),
-                        len(snr_data),
-                        alpha=(not opts.no_alpha),
-                        greyscale=opts.greyscale)
-    writer.write(out_file, (bytes(pixel_bytes(row)) for row in snr_data))
+    out_file.write(opts.last_image)
     out_file.close()
 
     opts.sequence += 1
@@ -147,6 +174,14 @@ def parse_args():
         action="store_true",
         help="Emit an image without alpha (transparency) channel instead of the default that "
         "includes alpha channel")
+    parser.add_argument(
+        "-c",
+        "--compression",
+        type=int,
+        choices=range(10),
+        metavar="LEVEL",
+        help="zlib compression level to use for the image data, from 0 for no compression (fastest "
+        "write) to 9 for most compression (smallest file), default: zlib default level")
     parser.add_argument("-e",
                         "--target",
                         help="host:port of dish to query, default is the standard IP address "
@@ -201,6 +236,9 @@ def main():
 
     logging.basicConfig(format="%(levelname)s: %(message)s")
 
+    opts.last_snr_data = None
+    opts.last_image = None
+
     context = starlink_grpc.ChannelContext(target=opts.target)
 
     try:
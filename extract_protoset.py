@@ -31,6 +31,8 @@ import grpc
 from yagrc import dump
 from yagrc import reflector
 
+import loop_util
+
 TARGET_DEFAULT = "192.168.100.1:9200"
 LOOP_TIME_DEFAULT = 0
 RETRY_DELAY_DEFAULT = 0
@@ -72,14 +74,16 @@ def parse_args():
     if opts.outdir is None and not opts.print_only:
         parser.error("Output dir is required unless --print-only option set")
 
+    # This script has no cron scheduling option, only the loop interval
+    opts.loop_cron = None
+
     return opts
 
 
-def loop_body(opts):
+def loop_body(opts, channel):
     while True:
         try:
-            with grpc.insecure_channel(opts.target) as channel:
-                protoset = dump.dump_protocols(channel)
+            protoset = dump.dump_protocols(channel)
             break
         except reflector.ServiceError as e:
             logging.error("Problem with reflection service: %s", str(e))
@@ -101,6 +105,10 @@ def loop_body(opts):
     filename = "{0:08x}_{1}.protoset".format(binascii.crc32(protoset), len(protoset))
     if opts.print_only:
         print("Protoset:", filename)
+    elif filename == opts.last_filename:
+        # Same as last time through the loop, so no need to check the file
+        if opts.verbose:
+            print("Existing protoset:", filename)
     else:
         try:
             with open(filename, mode="xb") as outfile:
@@ -109,6 +117,7 @@ def loop_body(opts):
         except FileExistsError:
             if opts.verbose:
                 print("Existing protoset:", filename)
+        opts.last_filename = filename
 
 
 def goto_dir(outdir):
@@ -126,16 +135,15 @@ def main():
     logging.basicConfig(format="%(levelname)s: %(message)s")
     if not opts.print_only:
         goto_dir(opts.outdir)
+    opts.last_filename = None
 
-    next_loop = time.monotonic()
-    while True:
-        loop_body(opts)
-        if opts.loop_interval > 0.0:
-            now = time.monotonic()
-            next_loop = max(next_loop + opts.loop_interval, now)
-            time.sleep(next_loop - now)
-        else:
-            break
+    # The channel will reconnect as needed if the connection gets dropped, so
+    # it can be kept open across loop iterations.
+    channel = grpc.insecure_channel(opts.target)
+    try:
+        loop_util.run_loop(opts, loop_body, opts, channel)
+    finally:
+        channel.close()
 
 
 if __name__ == "__main__":
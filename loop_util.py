@@ -68,7 +68,10 @@ def check_args(opts, parser):
 
 
 def run_loop(opts, loop_body, *loop_args):
-    signal.signal(signal.SIGTERM, handle_sigterm)
+    # Even when not looping, the handler is needed so that SIGTERM allows the
+    # caller to clean up, but there's no need to install it more than once.
+    if signal.getsignal(signal.SIGTERM) is not handle_sigterm:
+        signal.signal(signal.SIGTERM, handle_sigterm)
 
     rc = 0
     try:
@@ -76,16 +79,19 @@ def run_loop(opts, loop_body, *loop_args):
             rc = loop_body(*loop_args)
         elif opts.loop_cron:
             criter = croniter(opts.loop_cron, datetime.now(tz=opts.timezone))
-            now = time.time()
-            next_loop = criter.get_next(start_time=now)
+            now = last_check = time.time()
+            next_loop = criter.get_next(float, start_time=now)
             while True:
                 while now < next_loop:
-                    # This is to protect against clock getting set backwards
-                    # by a large amount. Normally, it should do nothing:
-                    next_loop = criter.get_next(start_time=now)
+                    if now < last_check:
+                        # Clock got set backwards, so the next scheduled time
+                        # may be much further away than it should be.
+                        next_loop = criter.get_next(float, start_time=now)
+                    last_check = now
                     time.sleep(min(next_loop - now, MAX_SLEEP))
                     now = time.time()
-                next_loop = criter.get_next(start_time=now)
+                last_check = now
+                next_loop = criter.get_next(float, start_time=now)
                 rc = loop_body(*loop_args)
                 now = time.time()
         else:
@@ -18,12 +18,14 @@ import starlink_grpc
 
 INITIAL_SAMPLES = 20
 LOOP_SLEEP_TIME = 4
+MAX_LOOP_SLEEP_TIME = 60
 
 
 def run_loop(context):
     samples = INITIAL_SAMPLES
     counter = None
     prev_triggered = False
+    idle_count = 0
     while True:
         try:
             # `starlink_grpc.status_data` returns a tuple of 3 dicts, but in case
@@ -58,6 +60,7 @@ def run_loop(context):
                     print()
 
             prev_triggered = triggered
+            idle_count = 0 if triggered else idle_count + 1
             # The following makes the next loop only pull the history samples that
             # are newer than the ones already examined.
             samples = -1
@@ -67,8 +70,11 @@ def run_loop(context):
         # Note that a 4 second loop will poll the history buffer pretty
         # frequently. Even though we only ask for new samples (which should
         # only be 4 of them), the grpc layer needs to pull the entire 12 hour
-        # history buffer each time, only to discard most of it.
-        time.sleep(LOOP_SLEEP_TIME)
+        # history buffer each time, only to discard most of it. So while
+        # nothing is triggering, back off to polling less often. No samples
+        # get missed by doing this, since the next poll will pick up all the
+        # ones since the last, it just delays noticing a new trigger a bit.
+        time.sleep(min(MAX_LOOP_SLEEP_TIME, LOOP_SLEEP_TIME * (1 << min(idle_count, 4))))
 
 
 def main():
@@ -418,6 +418,15 @@ from spacex.api.device import dish_pb2
 # prevent hang if the connection goes dead without closing.
 REQUEST_TIMEOUT = 10
 
+# The alert fields for the most recently seen DishAlerts descriptor, as a
+# (descriptor, fields) tuple, where fields is a tuple of (field name, alert
+# name, bit mask) tuples.
+_alert_fields_cache = None
+
+# Prebuilt Request messages for requests that take no parameters, by name of
+# the request field.
+_request_cache = {}
+
 HISTORY_FIELDS = ("pop_ping_drop_rate", "pop_ping_latency_ms", "downlink_throughput_bps",
                   "uplink_throughput_bps", "power_in")
 
@@ -602,6 +611,7 @@ class ChannelContext:
     """
     def __init__(self, target: Optional[str] = None) -> None:
         self.channel = None
+        self.stub = None
         self.target = "192.168.100.1:9200" if target is None else target
 
     def get_channel(self) -> Tuple[grpc.Channel, bool]:
@@ -615,6 +625,51 @@ class ChannelContext:
         if self.channel is not None:
             self.channel.close()
         self.channel = None
+        self.stub = None
+
+
+def _device_stub(channel: grpc.Channel, context: Optional[ChannelContext]):
+    """Return a Device service stub for a channel.
+
+    If the channel came from a context, the stub is kept on the context, so it
+    gets reused for as long as the channel is. It can't be created until the
+    lazy imports have been resolved, so it's created on first use.
+    """
+    if context is None:
+        return device_pb2_grpc.DeviceStub(channel)
+    if context.stub is None:
+        context.stub = device_pb2_grpc.DeviceStub(channel)
+    return context.stub
+
+
+def _simple_request(name: str):
+    """Return a Request message for a request type that has no parameters.
+
+    The message is built on first use, after any lazy imports have been
+    resolved, and then reused, since it never changes.
+    """
+    request = _request_cache.get(name)
+    if request is None:
+        request = device_pb2.Request(**{name: {}})
+        _request_cache[name] = request
+    return request
+
+
+def _alert_fields(alerts):
+    """Return field info for each alert in a DishAlerts message.
+
+    This is computed only once for each message descriptor.
+    """
+    global _alert_fields_cache
+    descriptor = alerts.DESCRIPTOR
+    cached = _alert_fields_cache
+    if cached is None or cached[0] is not descriptor:
+        cached = (descriptor,
+                  tuple((field.name, "alert_" + field.name,
+                         1 << (field.number - 1) if field.number < 65 else 0)
+                        for field in descriptor.fields))
+        _alert_fields_cache = cached
+    return cached[1]
 
 
 def call_with_channel(function, *args, context: Optional[ChannelContext] = None, **kwargs):
@@ -723,8 +778,8 @@ def get_status(context: Optional[ChannelContext] = None):
     def grpc_call(channel):
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
-        response = stub.Handle(device_pb2.Request(get_status={}), timeout=REQUEST_TIMEOUT)
+        stub = _device_stub(channel, context)
+        response = stub.Handle(_simple_request("get_status"), timeout=REQUEST_TIMEOUT)
         return response.dish_get_status
 
     return call_with_channel(grpc_call, context=context)
@@ -818,11 +873,12 @@ def status_data(
     alerts = {}
     alert_bits = 0
     try:
-        for field in status.alerts.DESCRIPTOR.fields:
-            value = getattr(status.alerts, field.name, False)
-            alerts["alert_" + field.name] = value
-            if field.number < 65:
-                alert_bits |= (1 if value else 0) << (field.number - 1)
+        status_alerts = status.alerts
+        for name, alert_name, mask in _alert_fields(status_alerts):
+            value = getattr(status_alerts, name, False)
+            alerts[alert_name] = value
+            if value:
+                alert_bits |= mask
     except AttributeError:
         pass
 
@@ -909,8 +965,8 @@ def get_location(context: Optional[ChannelContext] = None):
     def grpc_call(channel):
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
-        response = stub.Handle(device_pb2.Request(get_location={}), timeout=REQUEST_TIMEOUT)
+        stub = _device_stub(channel, context)
+        response = stub.Handle(_simple_request("get_location"), timeout=REQUEST_TIMEOUT)
         return response.get_location
 
     return call_with_channel(grpc_call, context=context)
@@ -1048,8 +1104,8 @@ def get_history(context: Optional[ChannelContext] = None):
     def grpc_call(channel: grpc.Channel):
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
-        response = stub.Handle(device_pb2.Request(get_history={}), timeout=REQUEST_TIMEOUT)
+        stub = _device_stub(channel, context)
+        response = stub.Handle(_simple_request("get_history"), timeout=REQUEST_TIMEOUT)
         return response.dish_get_history
 
     return call_with_channel(grpc_call, context=context)
@@ -1548,8 +1604,8 @@ def get_obstruction_map(context: Optional[ChannelContext] = None):
     def grpc_call(channel: grpc.Channel):
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
-        response = stub.Handle(device_pb2.Request(dish_get_obstruction_map={}),
+        stub = _device_stub(channel, context)
+        response = stub.Handle(_simple_request("dish_get_obstruction_map"),
                                timeout=REQUEST_TIMEOUT)
         return response.dish_get_obstruction_map
 
@@ -1602,8 +1658,8 @@ def reset_obstruction_map(context: Optional[ChannelContext] = None):
     def grpc_call(channel: grpc.Channel) -> None:
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
-        stub.Handle(device_pb2.Request(dish_clear_obstruction_map={}), timeout=REQUEST_TIMEOUT)
+        stub = _device_stub(channel, context)
+        stub.Handle(_simple_request("dish_clear_obstruction_map"), timeout=REQUEST_TIMEOUT)
         # response is empty message in this case, so just ignore it
 
     try:
@@ -1627,8 +1683,8 @@ def reboot(context: Optional[ChannelContext] = None) -> None:
     def grpc_call(channel: grpc.Channel) -> None:
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
-        stub.Handle(device_pb2.Request(reboot={}), timeout=REQUEST_TIMEOUT)
+        stub = _device_stub(channel, context)
+        stub.Handle(_simple_request("reboot"), timeout=REQUEST_TIMEOUT)
         # response is empty message in this case, so just ignore it
 
     try:
@@ -1654,7 +1710,7 @@ def set_stow_state(unstow: bool = False, context: Optional[ChannelContext] = Non
     def grpc_call(channel: grpc.Channel) -> None:
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
+        stub = _device_stub(channel, context)
         stub.Handle(device_pb2.Request(dish_stow={"unstow": unstow}), timeout=REQUEST_TIMEOUT)
         # response is empty message in this case, so just ignore it
 
@@ -1687,8 +1743,8 @@ def get_sleep_config(context: Optional[ChannelContext] = None) -> Tuple[int, int
     def grpc_call(channel: grpc.Channel):
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
-        response = stub.Handle(device_pb2.Request(dish_get_config={}), timeout=REQUEST_TIMEOUT)
+        stub = _device_stub(channel, context)
+        response = stub.Handle(_simple_request("dish_get_config"), timeout=REQUEST_TIMEOUT)
         return response.dish_get_config.dish_config
 
     config = call_with_channel(grpc_call, context=context)
@@ -1726,7 +1782,7 @@ def set_sleep_config(start: int,
     def grpc_call(channel: grpc.Channel) -> None:
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
+        stub = _device_stub(channel, context)
         stub.Handle(device_pb2.Request(
             dish_power_save={
                 "power_save_start_minutes": start,
@@ -1761,7 +1817,7 @@ def set_gps_config(enable: bool, context: Optional[ChannelContext] = None) -> bo
     def grpc_call(channel: grpc.Channel) -> None:
         if imports_pending:
             resolve_imports(channel)
-        stub = device_pb2_grpc.DeviceStub(channel)
+        stub = _device_stub(channel, context)
         response = stub.Handle(device_pb2.Request(dish_inhibit_gps={"inhibit_gps": not enable}),
                                timeout=REQUEST_TIMEOUT)
         return not response.dish_inhibit_gps.inhibit_gps
@@ -16,6 +16,11 @@ import sys
 
 from itertools import chain
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class JsonError(Exception):
     """Provides error info when something went wrong with JSON parsing."""
@@ -111,7 +116,15 @@ def get_history(filename):
         Various exceptions depending on Python version: Failure to open or
             read input or invalid JSON read on input.
     """
-    if filename == "-":
+    if orjson is not None:
+        # The history data is large enough for parsing speed to matter, so use
+        # orjson if it's installed. It parses straight from bytes.
+        if filename == "-":
+            json_data = orjson.loads(sys.stdin.buffer.read())
+        else:
+            with open(filename, "rb") as json_file:
+                json_data = orjson.loads(json_file.read())
+    elif filename == "-":
         json_data = json.load(sys.stdin)
     else:
         with open(filename) as json_file:
@@ -138,21 +151,29 @@ def _compute_sample_range(history, parse_samples, verbose=False):
     start = current - parse_samples
 
     if start == current:
-        return range(0), 0, current
+        return (), 0, current
 
     # This is ring buffer offset, so both index to oldest data sample and
     # index to next data sample after the newest one.
     end_offset = current % samples
     start_offset = start % samples
 
-    # Set the range for the requested set of samples. This will iterate
-    # sample index in order from oldest to newest.
+    # Set the slices for the requested set of samples, in order from oldest
+    # to newest. If the range wraps around the end of the ring buffer, it
+    # takes 2 slices to cover it.
     if start_offset < end_offset:
-        sample_range = range(start_offset, end_offset)
+        sample_slices = (slice(start_offset, end_offset),)
     else:
-        sample_range = chain(range(start_offset, samples), range(0, end_offset))
+        sample_slices = (slice(start_offset, samples), slice(0, end_offset))
+
+    return sample_slices, current - start, current
 
-    return sample_range, current - start, current
+
+def _sample_values(data, sample_slices):
+    """Return the samples selected by sample_slices from a history array."""
+    if len(sample_slices) == 1:
+        return data[sample_slices[0]]
+    return list(chain.from_iterable(data[x] for x in sample_slices))
 
 
 def history_bulk_data(filename, parse_samples, verbose=False):
@@ -184,21 +205,17 @@ def history_bulk_data(filename, parse_samples, verbose=False):
     except Exception as e:
         raise JsonError(e)
 
-    sample_range, parsed_samples, current = _compute_sample_range(history,
-                                                                  parse_samples,
-                                                                  verbose=verbose)
-
-    pop_ping_drop_rate = []
-    pop_ping_latency_ms = []
-    downlink_throughput_bps = []
-    uplink_throughput_bps = []
+    sample_slices, parsed_samples, current = _compute_sample_range(history,
+                                                                   parse_samples,
+                                                                   verbose=verbose)
 
-    for i in sample_range:
-        pop_ping_drop_rate.append(history["popPingDropRate"][i])
-        pop_ping_latency_ms.append(
-            history["popPingLatencyMs"][i] if history["popPingDropRate"][i] < 1 else None)
-        downlink_throughput_bps.append(history["downlinkThroughputBps"][i])
-        uplink_throughput_bps.append(history["uplinkThroughputBps"][i])
+    pop_ping_drop_rate = _sample_values(history["popPingDropRate"], sample_slices)
+    pop_ping_latency_ms = [
+        rtt if d < 1 else None for d, rtt in zip(
+            pop_ping_drop_rate, _sample_values(history["popPingLatencyMs"], sample_slices))
+    ]
+    downlink_throughput_bps = _sample_values(history["downlinkThroughputBps"], sample_slices)
+    uplink_throughput_bps = _sample_values(history["uplinkThroughputBps"], sample_slices)
 
     return {
         "samples": parsed_samples,
@@ -250,9 +267,9 @@ def history_stats(filename, parse_samples, verbose=False):
     except Exception as e:
         raise JsonError(e)
 
-    sample_range, parsed_samples, current = _compute_sample_range(history,
-                                                                  parse_samples,
-                                                                  verbose=verbose)
+    sample_slices, parsed_samples, current = _compute_sample_range(history,
+                                                                   parse_samples,
+                                                                   verbose=verbose)
 
     tot = 0.0
     count_full_drop = 0
@@ -275,8 +292,10 @@ def history_stats(filename, parse_samples, verbose=False):
     rtt_all = []
     rtt_buckets = [[] for _ in range(15)]
 
-    for i in sample_range:
-        d = history["popPingDropRate"][i]
+    for d, rtt, down, up in zip(_sample_values(history["popPingDropRate"], sample_slices),
+                                _sample_values(history["popPingLatencyMs"], sample_slices),
+                                _sample_values(history["downlinkThroughputBps"], sample_slices),
+                                _sample_values(history["uplinkThroughputBps"], sample_slices)):
         if d >= 1:
             # just in case...
             d = 1
@@ -295,12 +314,9 @@ def history_stats(filename, parse_samples, verbose=False):
             init_run_length = 0
         tot += d
 
-        down = history["downlinkThroughputBps"][i]
         usage_down += down
-        up = history["uplinkThroughputBps"][i]
         usage_up += up
 
-        rtt = history["popPingLatencyMs"][i]
         # note that "full" here means the opposite of ping drop full
         if d == 0.0:
             rtt_full.append(rtt)